@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Escrita atômica e determinística dos arquivos exportados
+
+- Todo arquivo é gravado em um temporário no mesmo diretório (mkstemp) e
+  movido com os.replace: um export interrompido nunca deixa arquivo truncado
+- Planilhas Excel têm datas fixas (propriedades e entradas do zip), para que
+  snapshots com os mesmos dados gerem arquivos idênticos e sejam deduplicados
+  pelo retention.py
+"""
+
+import io
+import os
+import re
+import zipfile
+import tempfile
+from contextlib import contextmanager
+
+TMP_PREFIX = '.tmp_'
+
+# Data fixa das entradas do zip (a menor aceita pelo formato)
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+# Data fixa de criação/modificação nas propriedades da planilha
+CORE_PROPERTIES_DATE = '1980-01-01T00:00:00Z'
+CORE_DATE_PATTERN = re.compile(
+    rb'(<dcterms:(created|modified)[^>]*>)[^<]*(</dcterms:\2>)'
+)
+
+def atomic_write(path, write, mode=0o644):
+    """Escreve em path de forma atômica
+
+    write recebe o arquivo temporário aberto em modo binário e grava o conteúdo.
+    """
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=TMP_PREFIX)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            os.fchmod(f.fileno(), mode)
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def atomic_write_bytes(path, data):
+    """Grava bytes em path de forma atômica"""
+    atomic_write(path, lambda f: f.write(data))
+
+def normalize_xlsx(data):
+    """Remove da planilha as datas que mudam a cada execução"""
+    output = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(data)) as source, \
+         zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as target:
+        for info in source.infolist():
+            content = source.read(info.filename)
+            if info.filename == 'docProps/core.xml':
+                content = CORE_DATE_PATTERN.sub(
+                    rb'\g<1>' + CORE_PROPERTIES_DATE.encode() + rb'\g<3>', content
+                )
+
+            entry = zipfile.ZipInfo(info.filename, date_time=ZIP_DATE_TIME)
+            entry.compress_type = zipfile.ZIP_DEFLATED
+            entry.external_attr = info.external_attr
+            target.writestr(entry, content)
+
+    return output.getvalue()
+
+@contextmanager
+def atomic_excel(path):
+    """Fornece um buffer para o ExcelWriter e grava a planilha de forma atômica
+
+    Uso:
+        with atomic_excel(excel_file) as buffer:
+            with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+                ...
+    """
+    buffer = io.BytesIO()
+    yield buffer
+    atomic_write_bytes(path, normalize_xlsx(buffer.getvalue()))
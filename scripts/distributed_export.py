@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+Exportação distribuída do SonarQube (coordenador/workers)
+
+O coordenador divide o trabalho em unidades (instância × projeto × branch ×
+tipo de export) em uma fila SQLite em um volume compartilhado. Vários workers
+(processos ou containers) reservam unidades com lease, executam os scripts de
+exportação e gravam os resultados no diretório de saída compartilhado.
+Unidades de workers que caíram voltam para a fila quando o lease expira.
+
+Uso:
+    python scripts/distributed_export.py coordinator   # Enfileira e aguarda
+    python scripts/distributed_export.py worker        # Processa a fila
+    python scripts/distributed_export.py status        # Mostra o andamento
+"""
+
+import os
+import json
+import time
+import socket
+import sqlite3
+import subprocess
+import threading
+import requests
+from datetime import datetime
+import sys
+
+# Configurações da exportação distribuída
+QUEUE_DB = os.getenv('EXPORT_QUEUE_DB', 'exports/queue.db')
+INSTANCES_FILE = os.getenv('EXPORT_INSTANCES_FILE', 'exports/instances.json')
+OUTPUT_DIR = os.getenv('EXPORT_OUTPUT_DIR', 'exports')
+EXPORT_TYPES = os.getenv('EXPORT_TYPES', 'metrics,issues,quality_gate').split(',')
+LEASE_SECONDS = int(os.getenv('EXPORT_LEASE_SECONDS', '300'))
+MAX_ATTEMPTS = int(os.getenv('EXPORT_MAX_ATTEMPTS', '3'))
+UNIT_TIMEOUT = int(os.getenv('EXPORT_UNIT_TIMEOUT', '3600'))
+RUN_TIMEOUT = int(os.getenv('EXPORT_RUN_TIMEOUT', '21600'))           # 0 = sem limite
+POLL_SECONDS = int(os.getenv('EXPORT_POLL_SECONDS', '5'))
+WORKER_ID = os.getenv('EXPORT_WORKER_ID', f"{socket.gethostname()}-{os.getpid()}")
+WORKER_KEEP_ALIVE = os.getenv('EXPORT_WORKER_KEEP_ALIVE', 'false').lower() in ('1', 'true', 'yes')
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+EXPORT_SCRIPTS = {
+    'metrics': 'export_metrics.py',
+    'issues': 'export_issues.py',
+    'quality_gate': 'export_quality_gate.py'
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_units (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    instance TEXT NOT NULL,
+    project TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    export_type TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    error TEXT,
+    finished_at TEXT,
+    UNIQUE (run_id, instance, project, branch, export_type)
+);
+CREATE INDEX IF NOT EXISTS idx_work_units_status ON work_units (status, lease_expires);
+"""
+
+def connect():
+    """Abre a fila SQLite compartilhada"""
+    os.makedirs(os.path.dirname(QUEUE_DB) or '.', exist_ok=True)
+
+    # isolation_level=None: as transações são controladas explicitamente
+    conn = sqlite3.connect(QUEUE_DB, timeout=60, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+def load_instances():
+    """Carrega as instâncias SonarQube a exportar
+
+    Formato do arquivo (projetos e branches são opcionais):
+    [{"name": "prod", "url": "http://sonarqube:9000", "username": "admin",
+      "password": "admin", "projects": [{"key": "teste", "branches": ["main"]}]}]
+    """
+    try:
+        with open(INSTANCES_FILE, 'r', encoding='utf-8') as f:
+            instances = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"❌ Erro ao ler {INSTANCES_FILE}: {e}")
+        return None
+
+    for instance in instances:
+        instance.setdefault('username', os.getenv('SONAR_USERNAME', 'admin'))
+        instance.setdefault('password', os.getenv('SONAR_PASSWORD', 'admin'))
+
+    return {instance['name']: instance for instance in instances}
+
+def discover_projects(instance):
+    """Lista todos os projetos de uma instância"""
+    print(f"🔍 Descobrindo projetos em {instance['name']} ({instance['url']})...")
+
+    url = f"{instance['url']}/api/components/search"
+    auth = (instance['username'], instance['password'])
+
+    projects = []
+    page = 1
+    page_size = 500
+
+    while True:
+        params = {
+            'qualifiers': 'TRK',
+            'p': page,
+            'ps': page_size
+        }
+
+        try:
+            response = requests.get(url, params=params, auth=auth, timeout=30)
+            response.raise_for_status()
+
+            data = response.json()
+            components = data.get('components', [])
+            projects.extend({'key': component['key']} for component in components)
+
+            total = data.get('paging', {}).get('total', 0)
+            if not components or len(projects) >= total:
+                break
+
+            page += 1
+
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Erro ao descobrir projetos de {instance['name']}: {e}")
+            return None
+
+    return projects
+
+def enqueue_run(conn, instances):
+    """Divide a exportação em unidades e as insere na fila"""
+    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    units = []
+    failed_units = []
+    for name, instance in instances.items():
+        projects = instance.get('projects')
+        if projects is None:
+            projects = discover_projects(instance)
+
+        if projects is None:
+            # Registrar a falha na fila para que status e código de saída a mostrem
+            failed_units.append((run_id, name, '*', '', 'discovery',
+                                 'failed', 'falha ao descobrir os projetos da instância'))
+            continue
+
+        for project in projects:
+            # Branch vazia = branch principal
+            for branch in project.get('branches') or ['']:
+                for export_type in EXPORT_TYPES:
+                    units.append((run_id, name, project['key'], branch, export_type))
+
+    conn.execute("BEGIN IMMEDIATE")
+    conn.executemany(
+        "INSERT OR IGNORE INTO work_units (run_id, instance, project, branch, export_type) "
+        "VALUES (?, ?, ?, ?, ?)",
+        units
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO work_units "
+        "(run_id, instance, project, branch, export_type, status, error) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        failed_units
+    )
+    conn.execute("COMMIT")
+
+    print(f"📋 Execução {run_id}: {len(units)} unidade(s) enfileirada(s)")
+    if failed_units:
+        print(f"❌ {len(failed_units)} instância(s) sem projetos descobertos")
+    return run_id
+
+def expire_leases(conn, now):
+    """Devolve à fila (ou falha, sem tentativas restantes) unidades com lease expirado
+
+    Deve ser chamada dentro de uma transação.
+    """
+    conn.execute(
+        "UPDATE work_units SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+        "error = 'lease expirado', worker = NULL, lease_expires = NULL "
+        "WHERE status = 'running' AND lease_expires < ?",
+        (MAX_ATTEMPTS, now)
+    )
+
+def claim_unit(conn):
+    """Reserva a próxima unidade pendente ou com lease expirado"""
+    now = time.time()
+
+    # BEGIN IMMEDIATE garante que apenas um worker reserve cada unidade
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        expire_leases(conn, now)
+
+        unit = conn.execute(
+            "SELECT * FROM work_units WHERE status = 'pending' ORDER BY id LIMIT 1"
+        ).fetchone()
+
+        if unit is not None:
+            conn.execute(
+                "UPDATE work_units SET status = 'running', worker = ?, lease_expires = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (WORKER_ID, now + LEASE_SECONDS, unit['id'])
+            )
+
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+    return unit
+
+def renew_lease(conn, unit_id):
+    """Renova o lease; retorna False se a unidade não pertence mais a este worker"""
+    cursor = conn.execute(
+        "UPDATE work_units SET lease_expires = ? "
+        "WHERE id = ? AND worker = ? AND status = 'running'",
+        (time.time() + LEASE_SECONDS, unit_id, WORKER_ID)
+    )
+    return cursor.rowcount == 1
+
+def finish_unit(conn, unit_id, error=None):
+    """Marca a unidade como concluída, devolvendo-a à fila em caso de erro"""
+    if error is None:
+        status_sql = "'done'"
+    else:
+        # Ainda há tentativas: a unidade volta a ficar pendente
+        status_sql = "CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END"
+
+    params = ([MAX_ATTEMPTS] if error is not None else []) + [
+        error, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), unit_id, WORKER_ID
+    ]
+    cursor = conn.execute(
+        f"UPDATE work_units SET status = {status_sql}, error = ?, finished_at = ?, "
+        "worker = NULL, lease_expires = NULL "
+        "WHERE id = ? AND worker = ? AND status = 'running'",
+        params
+    )
+    # False: o lease foi perdido e a unidade já não pertence a este worker
+    return cursor.rowcount == 1
+
+def get_unit_output_dir(unit):
+    """Diretório de saída compartilhado de uma unidade"""
+    parts = [OUTPUT_DIR, unit['instance'], unit['project']]
+    if unit['branch']:
+        parts.append(unit['branch'])
+    return os.path.join(*parts)
+
+class LeaseLost(Exception):
+    """O lease da unidade foi perdido enquanto o export executava"""
+
+def run_unit(unit, instance):
+    """Executa o script de exportação da unidade; retorna a mensagem de erro ou None
+
+    Enquanto o export executa, o lease é renovado em paralelo. Se ele for
+    perdido (outro worker pode ter reservado a unidade), o export é
+    interrompido e LeaseLost é lançada.
+    """
+    script = EXPORT_SCRIPTS.get(unit['export_type'])
+    if script is None:
+        return f"tipo de export desconhecido: {unit['export_type']}"
+
+    exports_dir = get_unit_output_dir(unit)
+    os.makedirs(exports_dir, exist_ok=True)
+
+    env = dict(os.environ)
+    env.update({
+        'SONAR_URL': instance['url'],
+        'SONAR_USERNAME': instance['username'],
+        'SONAR_PASSWORD': instance['password'],
+        'PROJECT_KEY': unit['project'],
+        'SONAR_BRANCH': unit['branch'],
+        'EXPORTS_DIR': exports_dir
+    })
+
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(SCRIPTS_DIR, script)],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+
+    stop = threading.Event()
+    lease_lost = threading.Event()
+
+    def heartbeat():
+        heartbeat_conn = None
+        interval = LEASE_SECONDS / 3
+        while not stop.wait(interval):
+            try:
+                if heartbeat_conn is None:
+                    heartbeat_conn = connect()
+                renewed = renew_lease(heartbeat_conn, unit['id'])
+            except sqlite3.OperationalError as e:
+                # Ex.: "database is locked": tentar de novo antes do lease expirar
+                print(f"⚠️  Erro ao renovar lease: {e}; tentando novamente")
+                interval = min(5, LEASE_SECONDS / 10)
+                continue
+
+            interval = LEASE_SECONDS / 3
+            if not renewed:
+                lease_lost.set()
+                process.terminate()
+                break
+
+        if heartbeat_conn is not None:
+            heartbeat_conn.close()
+
+    heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+    heartbeat_thread.start()
+    try:
+        output, _ = process.communicate(timeout=UNIT_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        return f"tempo limite de {UNIT_TIMEOUT}s excedido"
+    finally:
+        stop.set()
+        heartbeat_thread.join()
+
+    if lease_lost.is_set():
+        raise LeaseLost()
+
+    if process.returncode != 0:
+        output = output.strip().splitlines()
+        return '\n'.join(output[-5:]) or f"código de saída {process.returncode}"
+
+    return None
+
+def run_worker():
+    """Processa unidades da fila até que não haja mais trabalho
+
+    Com EXPORT_WORKER_KEEP_ALIVE o worker continua aguardando novas execuções.
+    """
+    instances = load_instances()
+    if instances is None:
+        sys.exit(1)
+
+    conn = connect()
+    print(f"👷 Worker {WORKER_ID} iniciado")
+    processed = 0
+
+    while True:
+        unit = claim_unit(conn)
+
+        if unit is None:
+            # Unidades em andamento podem voltar à fila se o worker delas cair
+            running = conn.execute(
+                "SELECT COUNT(*) FROM work_units WHERE status = 'running'"
+            ).fetchone()[0]
+            if running == 0 and not WORKER_KEEP_ALIVE:
+                break
+            time.sleep(POLL_SECONDS)
+            continue
+
+        label = (f"{unit['instance']}/{unit['project']}"
+                 f"{'@' + unit['branch'] if unit['branch'] else ''} [{unit['export_type']}]")
+        print(f"🚀 {label} (tentativa {unit['attempts'] + 1}/{MAX_ATTEMPTS})")
+
+        # Recarregar a cada unidade: instâncias podem ser adicionadas ou
+        # alteradas enquanto o worker está rodando
+        instances = load_instances() or instances
+
+        instance = instances.get(unit['instance'])
+        if instance is None:
+            finish_unit(conn, unit['id'], f"instância desconhecida: {unit['instance']}")
+            continue
+
+        try:
+            error = run_unit(unit, instance)
+        except LeaseLost:
+            print(f"⚠️  Lease de {label} perdido: export interrompido")
+            continue
+
+        if not finish_unit(conn, unit['id'], error):
+            print(f"⚠️  Lease de {label} perdido: resultado descartado")
+            continue
+        processed += 1
+
+        if error is None:
+            print(f"✅ {label} concluído")
+        else:
+            print(f"❌ {label} falhou: {error}")
+
+    conn.close()
+    print(f"🎉 Worker {WORKER_ID} finalizado ({processed} unidade(s) processada(s))")
+
+def get_status(conn, run_id=None):
+    """Conta as unidades por status"""
+    sql = "SELECT status, COUNT(*) FROM work_units"
+    params = ()
+    if run_id:
+        sql += " WHERE run_id = ?"
+        params = (run_id,)
+    sql += " GROUP BY status"
+
+    return {status: count for status, count in conn.execute(sql, params)}
+
+def print_status(conn, run_id=None):
+    """Imprime o andamento da fila"""
+    counts = get_status(conn, run_id)
+    print(f"📊 Pendentes: {counts.get('pending', 0)} | "
+          f"Em execução: {counts.get('running', 0)} | "
+          f"Concluídas: {counts.get('done', 0)} | "
+          f"Falhas: {counts.get('failed', 0)}")
+
+    failed = conn.execute(
+        "SELECT instance, project, branch, export_type, error FROM work_units "
+        "WHERE status = 'failed'" + (" AND run_id = ?" if run_id else ""),
+        (run_id,) if run_id else ()
+    ).fetchall()
+    for unit in failed:
+        print(f"   ❌ {unit['instance']}/{unit['project']} {unit['branch']} "
+              f"[{unit['export_type']}]: {unit['error']}")
+
+    return counts
+
+def fail_unfinished_units(conn, run_id, error):
+    """Marca como falha as unidades da execução que ainda não terminaram"""
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute(
+        "UPDATE work_units SET status = 'failed', error = ?, worker = NULL, lease_expires = NULL "
+        "WHERE run_id = ? AND status IN ('pending', 'running')",
+        (error, run_id)
+    )
+    conn.execute("COMMIT")
+
+def run_coordinator():
+    """Enfileira uma nova execução e aguarda os workers concluírem
+
+    Leases expirados também são tratados aqui, para que a execução avance (ou
+    falhe) mesmo sem workers ativos; após EXPORT_RUN_TIMEOUT a execução falha.
+    """
+    instances = load_instances()
+    if instances is None:
+        sys.exit(1)
+
+    conn = connect()
+    run_id = enqueue_run(conn, instances)
+    deadline = time.time() + RUN_TIMEOUT if RUN_TIMEOUT > 0 else None
+
+    print("⏳ Aguardando workers...")
+    while True:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            expire_leases(conn, time.time())
+            conn.execute("COMMIT")
+        except sqlite3.OperationalError as e:
+            # Fila ocupada: tentar novamente na próxima consulta
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            print(f"⚠️  Erro ao verificar leases: {e}")
+
+        counts = get_status(conn, run_id)
+        if counts.get('pending', 0) == 0 and counts.get('running', 0) == 0:
+            break
+
+        if deadline is not None and time.time() > deadline:
+            print(f"❌ Tempo limite de {RUN_TIMEOUT}s da execução excedido")
+            fail_unfinished_units(conn, run_id, 'tempo limite da execução excedido')
+            break
+
+        time.sleep(POLL_SECONDS)
+
+    counts = print_status(conn, run_id)
+    conn.close()
+
+    if counts.get('failed', 0):
+        print(f"⚠️  Execução {run_id} concluída com falhas")
+        sys.exit(1)
+
+    print(f"🎉 Execução {run_id} concluída com sucesso!")
+
+def main():
+    """Função principal"""
+    mode = sys.argv[1] if len(sys.argv) > 1 else ''
+
+    if mode == 'coordinator':
+        run_coordinator()
+    elif mode == 'worker':
+        run_worker()
+    elif mode == 'status':
+        conn = connect()
+        print_status(conn)
+        conn.close()
+    else:
+        print("Uso: python scripts/distributed_export.py [coordinator|worker|status]")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -113,7 +113,10 @@ create_consolidated_report() {
     
     print_message $BLUE "📄 Criando relatório consolidado..."
     
-    cat > "$report_file" << EOF
+    # Escrita atômica: o relatório só aparece com o nome final quando completo
+    local tmp_file=$(mktemp "exports/.tmp_XXXXXX")
+    
+    cat > "$tmp_file" << EOF
 # Relatório Consolidado SonarQube
 
 **Projeto:** ${PROJECT_KEY:-teste}                                      #Trocar para o PROJECT_KEY configurado na Sonar
@@ -133,7 +136,7 @@ $(ls -la exports/quality_gate_* 2>/dev/null | tail -n +2 | awk '{print "- " $9 "
 
 ## Resumo da Exportação
 
-- **Total de arquivos:** $(ls -1 exports/ 2>/dev/null | wc -l)
+- **Total de arquivos:** $(find exports/ -path '*/.*' -prune -o -type f -print 2>/dev/null | wc -l)
 - **Tamanho total:** $(du -sh exports/ 2>/dev/null | cut -f1 || echo "0")
 - **Status:** Concluído com sucesso
 - **Hora de conclusão:** $(date '+%Y-%m-%d %H:%M:%S')
@@ -142,33 +145,24 @@ $(ls -la exports/quality_gate_* 2>/dev/null | tail -n +2 | awk '{print "- " $9 "
 *Relatório gerado automaticamente pelo sistema de exportação SonarQube*
 EOF
 
+    chmod 644 "$tmp_file"
+    mv -f "$tmp_file" "$report_file"
+
     print_message $GREEN "✅ Relatório consolidado criado: $report_file"
 }
 
-# Função para limpar arquivos antigos (opcional)
+# Função para aplicar a política de retenção dos exports
 cleanup_old_files() {
-    local days_old=${1:-7}  # Padrão: 7 dias
-    
-    print_header "Limpeza de Arquivos Antigos"
+    local keep_daily=${1:-${RETENTION_KEEP_DAILY:-7}}  # Padrão: 7 snapshots diários
     
-    print_message $BLUE "🧹 Procurando arquivos com mais de $days_old dias..."
+    print_header "Retenção de Arquivos Antigos"
     
-    local old_files=$(find exports/ -name "*.json" -o -name "*.xlsx" -o -name "*.csv" -o -name "*.md" | \
-                     xargs ls -la 2>/dev/null | \
-                     awk -v days=$days_old 'BEGIN{cmd="date -d \""days" days ago\" +%Y%m%d"; cmd | getline cutoff_date} 
-                          {gsub(/-/, "", $6); if($6 < cutoff_date) print $9}' 2>/dev/null || true)
+    print_message $BLUE "🧹 Aplicando retenção (diários: $keep_daily, semanais: ${RETENTION_KEEP_WEEKLY:-4})..."
     
-    if [ -n "$old_files" ]; then
-        print_message $YELLOW "📋 Arquivos antigos encontrados:"
-        echo "$old_files"
-        
-        # Comentar a linha abaixo se quiser ativar a limpeza automática
-        # echo "$old_files" | xargs rm -f
-        # print_message $GREEN "✅ Arquivos antigos removidos"
-        
-        print_message $BLUE "💡 Para remover automaticamente, descomente a linha de limpeza no script"
+    if RETENTION_KEEP_DAILY=$keep_daily python scripts/retention.py; then
+        print_message $GREEN "✅ Retenção aplicada"
     else
-        print_message $GREEN "✅ Nenhum arquivo antigo encontrado"
+        print_message $YELLOW "⚠️  Falha ao aplicar a retenção dos exports"
     fi
 }
 
@@ -212,13 +206,13 @@ main() {
     # Criar relatório consolidado
     create_consolidated_report
     
-    # Limpeza de arquivos antigos (opcional)
-    cleanup_old_files 7
+    # Retenção, compressão e deduplicação dos exports
+    cleanup_old_files
     
     # Resumo final
     print_header "📋 RESUMO FINAL"
     
-    local total_files=$(ls -1 exports/ 2>/dev/null | wc -l)
+    local total_files=$(find exports/ -path '*/.*' -prune -o -type f -print 2>/dev/null | wc -l)
     local total_size=$(du -sh exports/ 2>/dev/null | cut -f1 || echo "0")
     
     print_message $BLUE "📊 Estatísticas da exportação:"
@@ -4,17 +4,41 @@ Script para exportar issues (problemas) do SonarQube
 """
 
 import os
+import re
+import html
+import threading
 import requests
 import json
 import pandas as pd
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import sys
 
+from atomic_io import atomic_write, atomic_excel
+
 # Configurações do SonarQube
 SONAR_URL = os.getenv('SONAR_URL', 'http://sonarqube:9000')
 SONAR_USERNAME = os.getenv('SONAR_USERNAME', 'admin')
 SONAR_PASSWORD = os.getenv('SONAR_PASSWORD', 'admin')
 PROJECT_KEY = os.getenv('PROJECT_KEY', 'teste')                 #Trocar para o PROJECT_KEY configurado na Sonar
+SONAR_BRANCH = os.getenv('SONAR_BRANCH', '')                     # Vazio = branch principal
+EXPORTS_DIR = os.getenv('EXPORTS_DIR', 'exports')
+
+# Enriquecimento com trechos de código (0 = desativado)
+SOURCE_CONTEXT_LINES = int(os.getenv('ISSUES_SOURCE_CONTEXT', '0'))
+SOURCE_WORKERS = int(os.getenv('ISSUES_SOURCE_WORKERS', '8'))
+SOURCE_CACHE_FILE = os.getenv('ISSUES_SOURCE_CACHE', f'{EXPORTS_DIR}/.cache/source_lines.json')
+SOURCE_CACHE_MAX_FILES = int(os.getenv('ISSUES_SOURCE_CACHE_MAX_FILES', '5000'))
+SOURCE_CACHE_MAX_LINES = int(os.getenv('ISSUES_SOURCE_CACHE_MAX_LINES', '200000'))
+# Limite de caracteres do trecho (uma célula do Excel aceita até 32.767)
+SOURCE_CONTEXT_MAX_CHARS = int(os.getenv('ISSUES_SOURCE_MAX_CHARS', '32000'))
+
+HTML_TAG_PATTERN = re.compile(r'<[^>]+>')
+
+# Uma sessão HTTP por thread para reaproveitar conexões
+_thread_local = threading.local()
 
 def get_auth():
     """Retorna a autenticação para SonarQube"""
@@ -59,6 +83,8 @@ def get_project_issues():
             'ps': page_size,
             'facets': 'severities,types,rules,statuses'
         }
+        if SONAR_BRANCH:
+            params['branch'] = SONAR_BRANCH
         
         try:
             response = requests.get(url, params=params, auth=get_auth())
@@ -89,7 +115,231 @@ def get_project_issues():
     print(f"📊 Total de issues encontradas: {len(all_issues)}")
     return all_issues, facets
 
-def process_issues(issues):
+def get_session():
+    """Retorna a sessão HTTP da thread atual"""
+    if not hasattr(_thread_local, 'session'):
+        _thread_local.session = requests.Session()
+        _thread_local.session.auth = get_auth()
+    return _thread_local.session
+
+def get_analysis_date():
+    """Obtém a data da última análise do projeto (usada como versão do cache)"""
+    url = f"{SONAR_URL}/api/components/show"
+    params = {
+        'component': PROJECT_KEY
+    }
+    if SONAR_BRANCH:
+        params['branch'] = SONAR_BRANCH
+
+    try:
+        response = requests.get(url, params=params, auth=get_auth())
+        response.raise_for_status()
+
+        data = response.json()
+        return data.get('component', {}).get('analysisDate', '')
+
+    except requests.exceptions.RequestException as e:
+        print(f"⚠️  Erro ao obter data da análise: {e}")
+        return ''
+
+def load_source_cache():
+    """Carrega o cache LRU de trechos de código salvo em execuções anteriores"""
+    try:
+        with open(SOURCE_CACHE_FILE, 'r', encoding='utf-8') as f:
+            return OrderedDict(json.load(f))
+    except (OSError, ValueError):
+        return OrderedDict()
+
+def save_source_cache(cache):
+    """Salva o cache LRU de forma atômica, descartando as entradas mais antigas
+
+    O cache é limitado pelo número de arquivos e pelo total de linhas guardadas.
+    """
+    total_lines = sum(len(entry.get('lines', {})) for entry in cache.values())
+    while cache and (len(cache) > SOURCE_CACHE_MAX_FILES or total_lines > SOURCE_CACHE_MAX_LINES):
+        _, entry = cache.popitem(last=False)
+        total_lines -= len(entry.get('lines', {}))
+
+    os.makedirs(os.path.dirname(SOURCE_CACHE_FILE) or '.', exist_ok=True)
+
+    try:
+        cache_data = json.dumps(cache, ensure_ascii=False).encode('utf-8')
+        atomic_write(SOURCE_CACHE_FILE, lambda f: f.write(cache_data))
+    except OSError as e:
+        print(f"⚠️  Erro ao salvar cache de código: {e}")
+
+def get_issue_line_range(issue):
+    """Retorna as linhas (início, fim) de uma issue, ou None se não tiver linha"""
+    text_range = issue.get('textRange')
+    if text_range:
+        return text_range.get('startLine'), text_range.get('endLine')
+
+    line = issue.get('line')
+    if line:
+        return line, line
+
+    return None
+
+def get_context_windows(ranges):
+    """Intervalos de linhas necessários (issue + contexto), mesclando sobreposições"""
+    windows = []
+    for start, end in sorted(ranges):
+        window_from = max(1, start - SOURCE_CONTEXT_LINES)
+        window_to = end + SOURCE_CONTEXT_LINES
+        if windows and window_from <= windows[-1][1] + 1:
+            windows[-1][1] = max(windows[-1][1], window_to)
+        else:
+            windows.append([window_from, window_to])
+    return windows
+
+def windows_cover(cached_windows, windows):
+    """Verifica se todos os intervalos estão contidos nos intervalos em cache"""
+    return all(
+        any(cached_from <= window_from and window_to <= cached_to
+            for cached_from, cached_to in cached_windows)
+        for window_from, window_to in windows
+    )
+
+def fetch_source_lines(component, line_from, line_to):
+    """Busca um intervalo de linhas de um arquivo (uma única chamada por arquivo)"""
+    url = f"{SONAR_URL}/api/sources/lines"
+    params = {
+        'key': component,
+        'from': line_from,
+        'to': line_to
+    }
+    if SONAR_BRANCH:
+        params['branch'] = SONAR_BRANCH
+
+    try:
+        response = get_session().get(url, params=params, timeout=30)
+        response.raise_for_status()
+
+        # O código vem com realce em HTML: manter apenas o texto, sem os
+        # caracteres de controle (ex.: form feed) que o Excel não aceita
+        return {
+            str(source['line']): ILLEGAL_CHARACTERS_RE.sub(
+                '', html.unescape(HTML_TAG_PATTERN.sub('', source.get('code', '')))
+            )
+            for source in response.json().get('sources', [])
+        }
+
+    except requests.exceptions.RequestException as e:
+        print(f"⚠️  Erro ao obter código de {component}: {e}")
+        return None
+
+def enrich_issues_with_source(issues):
+    """Obtém o trecho de código ao redor de cada issue
+
+    As issues são agrupadas por arquivo e cada arquivo é buscado uma única vez,
+    cobrindo todas as suas linhas, com as buscas feitas em paralelo.
+    Retorna um dicionário {key da issue: trecho formatado}.
+    """
+    print(f"📄 Obtendo trechos de código ({SOURCE_CONTEXT_LINES} linha(s) de contexto)...")
+
+    # Agrupar intervalos por arquivo
+    ranges_by_component = {}
+    for issue in issues:
+        line_range = get_issue_line_range(issue)
+        if not line_range:
+            continue
+        ranges_by_component.setdefault(issue.get('component', ''), []).append(line_range)
+
+    analysis_date = get_analysis_date()
+    cache = load_source_cache()
+
+    def get_cache_key(component):
+        # Instância e branch na chave: o arquivo de cache pode ser compartilhado
+        return f"{SONAR_URL}|{SONAR_BRANCH}|{component}@{analysis_date}"
+
+    sources = {}
+    pending = {}
+    windows_by_component = {}
+    for component, ranges in ranges_by_component.items():
+        windows = get_context_windows(ranges)
+        windows_by_component[component] = windows
+        cache_key = get_cache_key(component)
+
+        cached = cache.get(cache_key)
+        if cached and windows_cover(cached.get('windows', []), windows):
+            cache.move_to_end(cache_key)
+            sources[component] = cached['lines']
+        else:
+            # Uma única chamada cobrindo todas as issues do arquivo
+            pending[component] = (windows[0][0], windows[-1][1])
+
+    print(f"📊 Arquivos com issues: {len(ranges_by_component)} "
+          f"({len(ranges_by_component) - len(pending)} em cache)")
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=SOURCE_WORKERS) as executor:
+            futures = {
+                component: executor.submit(fetch_source_lines, component, line_from, line_to)
+                for component, (line_from, line_to) in pending.items()
+            }
+
+        for component, future in futures.items():
+            lines = future.result()
+            if lines is None:
+                continue
+
+            sources[component] = lines
+            # Só é possível reaproveitar com uma data de análise conhecida
+            if analysis_date:
+                # Guardar apenas as janelas usadas, não as linhas entre as issues
+                windows = windows_by_component[component]
+                cache_key = get_cache_key(component)
+                cache[cache_key] = {
+                    'windows': windows,
+                    'lines': {
+                        str(number): lines[str(number)]
+                        for window_from, window_to in windows
+                        for number in range(window_from, window_to + 1)
+                        if str(number) in lines
+                    }
+                }
+                # Reatribuir não muda a posição no OrderedDict
+                cache.move_to_end(cache_key)
+
+    # Salvar sempre, para registrar também o uso das entradas vindas do cache
+    if analysis_date:
+        save_source_cache(cache)
+
+    # Montar o trecho de cada issue
+    contexts = {}
+    for issue in issues:
+        line_range = get_issue_line_range(issue)
+        lines = sources.get(issue.get('component', ''))
+        if not line_range or lines is None:
+            continue
+
+        start, end = line_range
+        snippet = []
+        size = 0
+        truncated_marker = '... (trecho truncado)'
+        for number in range(max(1, start - SOURCE_CONTEXT_LINES), end + SOURCE_CONTEXT_LINES + 1):
+            code = lines.get(str(number))
+            if code is None:
+                continue
+            marker = '>' if start <= number <= end else ' '
+            line = f"{marker}{number:>5} | {code}"
+
+            # Issues que cobrem uma classe inteira geram trechos enormes
+            if size + len(line) + 1 > SOURCE_CONTEXT_MAX_CHARS - len(truncated_marker):
+                room = SOURCE_CONTEXT_MAX_CHARS - len(truncated_marker) - size - 1
+                if room > 0:
+                    snippet.append(line[:room])
+                snippet.append(truncated_marker)
+                break
+
+            snippet.append(line)
+            size += len(line) + 1
+
+        contexts[issue.get('key', '')] = '\n'.join(snippet)
+
+    return contexts
+
+def process_issues(issues, source_contexts=None):
     """Processa issues para exportação"""
     processed_issues = []
     
@@ -113,6 +363,9 @@ def process_issues(issues):
             'Fluxo': issue.get('flows', [])
         }
         
+        if source_contexts is not None:
+            processed_issue['Contexto_Codigo'] = source_contexts.get(issue.get('key', ''), '')
+        
         processed_issues.append(processed_issue)
     
     return processed_issues
@@ -154,7 +407,7 @@ def create_summary_stats(issues, facets):
     
     return summary
 
-def export_issues_to_files(issues, facets):
+def export_issues_to_files(issues, facets, source_contexts=None):
     """Exporta issues para arquivos"""
     if not issues:
         print("❌ Nenhuma issue para exportar")
@@ -163,7 +416,7 @@ def export_issues_to_files(issues, facets):
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
     # Processar issues
-    processed_issues = process_issues(issues)
+    processed_issues = process_issues(issues, source_contexts)
     
     # Criar estatísticas
     summary = create_summary_stats(issues, facets)
@@ -171,13 +424,12 @@ def export_issues_to_files(issues, facets):
     # Informações do projeto
     project_info = {
         'Projeto': PROJECT_KEY,
-        'Data_Exportacao': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         'URL_SonarQube': SONAR_URL,
         'Total_Issues': len(issues)
     }
     
     # Exportar para JSON
-    json_file = f"exports/issues_{PROJECT_KEY}_{timestamp}.json"
+    json_file = f"{EXPORTS_DIR}/issues_{PROJECT_KEY}_{timestamp}.json"
     export_data = {
         'project_info': project_info,
         'summary': summary,
@@ -185,48 +437,49 @@ def export_issues_to_files(issues, facets):
         'facets': facets
     }
     
-    with open(json_file, 'w', encoding='utf-8') as f:
-        json.dump(export_data, f, ensure_ascii=False, indent=2)
+    json_data = json.dumps(export_data, ensure_ascii=False, indent=2).encode('utf-8')
+    atomic_write(json_file, lambda f: f.write(json_data))
     
     print(f"✅ Issues exportadas para: {json_file}")
     
     # Exportar para Excel
-    excel_file = f"exports/issues_{PROJECT_KEY}_{timestamp}.xlsx"
-    with pd.ExcelWriter(excel_file, engine='openpyxl') as writer:
-        # Aba com todas as issues
-        df_issues = pd.DataFrame(processed_issues)
-        df_issues.to_excel(writer, sheet_name='Issues', index=False)
+    excel_file = f"{EXPORTS_DIR}/issues_{PROJECT_KEY}_{timestamp}.xlsx"
+    with atomic_excel(excel_file) as buffer:
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+            # Aba com todas as issues
+            df_issues = pd.DataFrame(processed_issues)
+            df_issues.to_excel(writer, sheet_name='Issues', index=False)
         
-        # Aba com resumo por tipo
-        df_type = pd.DataFrame(list(summary['by_type'].items()), 
-                              columns=['Tipo', 'Quantidade'])
-        df_type.to_excel(writer, sheet_name='Resumo_Tipo', index=False)
+            # Aba com resumo por tipo
+            df_type = pd.DataFrame(list(summary['by_type'].items()), 
+                                  columns=['Tipo', 'Quantidade'])
+            df_type.to_excel(writer, sheet_name='Resumo_Tipo', index=False)
         
-        # Aba com resumo por severidade
-        df_severity = pd.DataFrame(list(summary['by_severity'].items()), 
-                                  columns=['Severidade', 'Quantidade'])
-        df_severity.to_excel(writer, sheet_name='Resumo_Severidade', index=False)
+            # Aba com resumo por severidade
+            df_severity = pd.DataFrame(list(summary['by_severity'].items()), 
+                                      columns=['Severidade', 'Quantidade'])
+            df_severity.to_excel(writer, sheet_name='Resumo_Severidade', index=False)
         
-        # Aba com resumo por status
-        df_status = pd.DataFrame(list(summary['by_status'].items()), 
-                                columns=['Status', 'Quantidade'])
-        df_status.to_excel(writer, sheet_name='Resumo_Status', index=False)
+            # Aba com resumo por status
+            df_status = pd.DataFrame(list(summary['by_status'].items()), 
+                                    columns=['Status', 'Quantidade'])
+            df_status.to_excel(writer, sheet_name='Resumo_Status', index=False)
         
-        # Aba com top regras
-        df_rules = pd.DataFrame(list(summary['by_rule'].items()), 
-                               columns=['Regra', 'Quantidade'])
-        df_rules.to_excel(writer, sheet_name='Top_Regras', index=False)
+            # Aba com top regras
+            df_rules = pd.DataFrame(list(summary['by_rule'].items()), 
+                                   columns=['Regra', 'Quantidade'])
+            df_rules.to_excel(writer, sheet_name='Top_Regras', index=False)
         
-        # Aba com informações do projeto
-        df_info = pd.DataFrame([project_info])
-        df_info.to_excel(writer, sheet_name='Informações', index=False)
+            # Aba com informações do projeto
+            df_info = pd.DataFrame([project_info])
+            df_info.to_excel(writer, sheet_name='Informações', index=False)
     
     print(f"✅ Issues exportadas para: {excel_file}")
     
     # Exportar para CSV
-    csv_file = f"exports/issues_{PROJECT_KEY}_{timestamp}.csv"
+    csv_file = f"{EXPORTS_DIR}/issues_{PROJECT_KEY}_{timestamp}.csv"
     df_issues = pd.DataFrame(processed_issues)
-    df_issues.to_csv(csv_file, index=False, encoding='utf-8')
+    atomic_write(csv_file, lambda f: df_issues.to_csv(f, index=False, encoding='utf-8'))
     print(f"✅ Issues exportadas para: {csv_file}")
 
 def main():
@@ -243,8 +496,13 @@ def main():
     issues, facets = get_project_issues()
     
     if issues is not None:
+        # Enriquecer com trechos de código (opcional)
+        source_contexts = None
+        if SOURCE_CONTEXT_LINES > 0 and issues:
+            source_contexts = enrich_issues_with_source(issues)
+        
         # Exportar para arquivos
-        export_issues_to_files(issues, facets)
+        export_issues_to_files(issues, facets, source_contexts)
         print("\n🎉 Exportação de issues concluída com sucesso!")
     else:
         print("❌ Falha na exportação de issues")
@@ -10,11 +10,15 @@ import pandas as pd
 from datetime import datetime
 import sys
 
+from atomic_io import atomic_write, atomic_excel
+
 # Configurações do SonarQube
 SONAR_URL = os.getenv('SONAR_URL', 'http://sonarqube:9000')
 SONAR_USERNAME = os.getenv('SONAR_USERNAME', 'admin')
 SONAR_PASSWORD = os.getenv('SONAR_PASSWORD', 'admin')
 PROJECT_KEY = os.getenv('PROJECT_KEY', 'teste')                                 #Trocar para o PROJECT_KEY configurado na Sonar
+SONAR_BRANCH = os.getenv('SONAR_BRANCH', '')                     # Vazio = branch principal
+EXPORTS_DIR = os.getenv('EXPORTS_DIR', 'exports')
 
 def get_auth():
     """Retorna a autenticação para SonarQube"""
@@ -69,6 +73,8 @@ def get_project_metrics():
         'component': PROJECT_KEY,
         'metricKeys': ','.join(metrics)
     }
+    if SONAR_BRANCH:
+        params['branch'] = SONAR_BRANCH
     
     try:
         response = requests.get(url, params=params, auth=get_auth())
@@ -118,36 +124,36 @@ def export_metrics_to_files(metrics_data):
     # Adicionar informações do projeto
     project_info = {
         'Projeto': PROJECT_KEY,
-        'Data_Exportacao': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         'URL_SonarQube': SONAR_URL
     }
     
     # Exportar para JSON
-    json_file = f"exports/metrics_{PROJECT_KEY}_{timestamp}.json"
+    json_file = f"{EXPORTS_DIR}/metrics_{PROJECT_KEY}_{timestamp}.json"
     export_data = {
         'project_info': project_info,
         'metrics': processed_data
     }
     
-    with open(json_file, 'w', encoding='utf-8') as f:
-        json.dump(export_data, f, ensure_ascii=False, indent=2)
+    json_data = json.dumps(export_data, ensure_ascii=False, indent=2).encode('utf-8')
+    atomic_write(json_file, lambda f: f.write(json_data))
     
     print(f"✅ Métricas exportadas para: {json_file}")
     
     # Exportar para Excel
-    excel_file = f"exports/metrics_{PROJECT_KEY}_{timestamp}.xlsx"
-    with pd.ExcelWriter(excel_file, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Métricas', index=False)
+    excel_file = f"{EXPORTS_DIR}/metrics_{PROJECT_KEY}_{timestamp}.xlsx"
+    with atomic_excel(excel_file) as buffer:
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+            df.to_excel(writer, sheet_name='Métricas', index=False)
         
-        # Adicionar informações do projeto
-        info_df = pd.DataFrame([project_info])
-        info_df.to_excel(writer, sheet_name='Informações', index=False)
+            # Adicionar informações do projeto
+            info_df = pd.DataFrame([project_info])
+            info_df.to_excel(writer, sheet_name='Informações', index=False)
     
     print(f"✅ Métricas exportadas para: {excel_file}")
     
     # Exportar para CSV
-    csv_file = f"exports/metrics_{PROJECT_KEY}_{timestamp}.csv"
-    df.to_csv(csv_file, index=False, encoding='utf-8')
+    csv_file = f"{EXPORTS_DIR}/metrics_{PROJECT_KEY}_{timestamp}.csv"
+    atomic_write(csv_file, lambda f: df.to_csv(f, index=False, encoding='utf-8'))
     print(f"✅ Métricas exportadas para: {csv_file}")
 
 def main():
@@ -10,11 +10,15 @@ import pandas as pd
 from datetime import datetime
 import sys
 
+from atomic_io import atomic_write, atomic_excel
+
 # Configurações do SonarQube
 SONAR_URL = os.getenv('SONAR_URL', 'http://sonarqube:9000')
 SONAR_USERNAME = os.getenv('SONAR_USERNAME', 'admin')
 SONAR_PASSWORD = os.getenv('SONAR_PASSWORD', 'admin')
 PROJECT_KEY = os.getenv('PROJECT_KEY', 'teste')                         #Trocar para o PROJECT_KEY configurado na Sonar
+SONAR_BRANCH = os.getenv('SONAR_BRANCH', '')                     # Vazio = branch principal
+EXPORTS_DIR = os.getenv('EXPORTS_DIR', 'exports')
 
 def get_auth():
     """Retorna a autenticação para SonarQube"""
@@ -50,6 +54,8 @@ def get_project_quality_gate():
     params = {
         'projectKey': PROJECT_KEY
     }
+    if SONAR_BRANCH:
+        params['branch'] = SONAR_BRANCH
     
     try:
         response = requests.get(url, params=params, auth=get_auth())
@@ -107,6 +113,8 @@ def get_project_analysis_history():
         'project': PROJECT_KEY,
         'ps': 50  # Últimas 50 análises
     }
+    if SONAR_BRANCH:
+        params['branch'] = SONAR_BRANCH
     
     try:
         response = requests.get(url, params=params, auth=get_auth())
@@ -178,13 +186,12 @@ def export_quality_gate_to_files(qg_status, qg_details, analyses):
     # Informações do projeto
     project_info = {
         'Projeto': PROJECT_KEY,
-        'Data_Exportacao': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         'URL_SonarQube': SONAR_URL,
         'Status_Quality_Gate': current_status['Status']
     }
     
     # Exportar para JSON
-    json_file = f"exports/quality_gate_{PROJECT_KEY}_{timestamp}.json"
+    json_file = f"{EXPORTS_DIR}/quality_gate_{PROJECT_KEY}_{timestamp}.json"
     export_data = {
         'project_info': project_info,
         'current_status': current_status,
@@ -193,43 +200,44 @@ def export_quality_gate_to_files(qg_status, qg_details, analyses):
         'analysis_history': analysis_history
     }
     
-    with open(json_file, 'w', encoding='utf-8') as f:
-        json.dump(export_data, f, ensure_ascii=False, indent=2)
+    json_data = json.dumps(export_data, ensure_ascii=False, indent=2).encode('utf-8')
+    atomic_write(json_file, lambda f: f.write(json_data))
     
     print(f"✅ Quality Gate exportado para: {json_file}")
     
     # Exportar para Excel
-    excel_file = f"exports/quality_gate_{PROJECT_KEY}_{timestamp}.xlsx"
-    with pd.ExcelWriter(excel_file, engine='openpyxl') as writer:
-        # Aba com status atual
-        df_status = pd.DataFrame([current_status])
-        df_status.to_excel(writer, sheet_name='Status_Atual', index=False)
+    excel_file = f"{EXPORTS_DIR}/quality_gate_{PROJECT_KEY}_{timestamp}.xlsx"
+    with atomic_excel(excel_file) as buffer:
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+            # Aba com status atual
+            df_status = pd.DataFrame([current_status])
+            df_status.to_excel(writer, sheet_name='Status_Atual', index=False)
         
-        # Aba com condições
-        if conditions:
-            df_conditions = pd.DataFrame(conditions)
-            df_conditions.to_excel(writer, sheet_name='Condicoes', index=False)
+            # Aba com condições
+            if conditions:
+                df_conditions = pd.DataFrame(conditions)
+                df_conditions.to_excel(writer, sheet_name='Condicoes', index=False)
         
-        # Aba com informações do Quality Gate
-        df_qg_info = pd.DataFrame([qg_info])
-        df_qg_info.to_excel(writer, sheet_name='Quality_Gate_Info', index=False)
+            # Aba com informações do Quality Gate
+            df_qg_info = pd.DataFrame([qg_info])
+            df_qg_info.to_excel(writer, sheet_name='Quality_Gate_Info', index=False)
         
-        # Aba com histórico de análises
-        if analysis_history:
-            df_history = pd.DataFrame(analysis_history)
-            df_history.to_excel(writer, sheet_name='Historico_Analises', index=False)
+            # Aba com histórico de análises
+            if analysis_history:
+                df_history = pd.DataFrame(analysis_history)
+                df_history.to_excel(writer, sheet_name='Historico_Analises', index=False)
         
-        # Aba com informações do projeto
-        df_info = pd.DataFrame([project_info])
-        df_info.to_excel(writer, sheet_name='Informações', index=False)
+            # Aba com informações do projeto
+            df_info = pd.DataFrame([project_info])
+            df_info.to_excel(writer, sheet_name='Informações', index=False)
     
     print(f"✅ Quality Gate exportado para: {excel_file}")
     
     # Exportar condições para CSV
     if conditions:
-        csv_file = f"exports/quality_gate_conditions_{PROJECT_KEY}_{timestamp}.csv"
+        csv_file = f"{EXPORTS_DIR}/quality_gate_conditions_{PROJECT_KEY}_{timestamp}.csv"
         df_conditions = pd.DataFrame(conditions)
-        df_conditions.to_csv(csv_file, index=False, encoding='utf-8')
+        atomic_write(csv_file, lambda f: df_conditions.to_csv(f, index=False, encoding='utf-8'))
         print(f"✅ Condições do Quality Gate exportadas para: {csv_file}")
 
 def print_quality_gate_summary(qg_status, qg_details):
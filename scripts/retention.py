@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Script de retenção dos exports do SonarQube
+
+- Aplica política de retenção (mantém N snapshots diários e N semanais)
+- Deduplica arquivos idênticos em um repositório endereçado por conteúdo
+  (exports/.store), usando hard links
+- Comprime exports antigos (zstd, se disponível, ou gzip)
+- Todas as escritas são atômicas (arquivo temporário + os.replace, ver atomic_io.py)
+- Remove temporários abandonados por exports interrompidos
+"""
+
+import os
+import re
+import gzip
+import hashlib
+import tempfile
+import time
+from datetime import datetime, timedelta
+import sys
+
+from atomic_io import atomic_write, TMP_PREFIX
+
+# zstandard é opcional: sem ele, a compressão usa gzip
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Configurações de retenção
+EXPORTS_DIR = os.getenv('EXPORTS_DIR', 'exports')
+KEEP_DAILY = int(os.getenv('RETENTION_KEEP_DAILY', '7'))
+KEEP_WEEKLY = int(os.getenv('RETENTION_KEEP_WEEKLY', '4'))
+COMPRESS_AFTER_DAYS = int(os.getenv('RETENTION_COMPRESS_AFTER_DAYS', '2'))
+COMPRESSION = os.getenv('RETENTION_COMPRESSION', 'auto')             # auto, zstd, gzip ou none
+DRY_RUN = os.getenv('RETENTION_DRY_RUN', 'false').lower() in ('1', 'true', 'yes')
+
+STORE_DIR = os.path.join(EXPORTS_DIR, '.store')
+CHUNK_SIZE = 1024 * 1024
+# Temporários de escritas interrompidas são removidos após este tempo
+STALE_TMP_SECONDS = 24 * 60 * 60
+
+# Ex.: issues_teste_20240101_120000.json(.gz)
+EXPORT_PATTERN = re.compile(r'^(?P<serie>.+)_(?P<timestamp>\d{8}_\d{6})\.(?P<ext>[A-Za-z0-9.]+)$')
+
+# Extensões que valem a pena comprimir (xlsx já é um zip)
+COMPRESSIBLE_EXTENSIONS = ('json', 'csv', 'md')
+COMPRESSED_SUFFIXES = ('.gz', '.zst')
+
+def get_compression():
+    """Retorna o algoritmo de compressão efetivo"""
+    if COMPRESSION == 'auto':
+        return 'zstd' if zstandard is not None else 'gzip'
+    if COMPRESSION == 'zstd' and zstandard is None:
+        print("⚠️  Módulo zstandard não instalado, usando gzip")
+        return 'gzip'
+    return COMPRESSION
+
+def scan_exports():
+    """Agrupa os arquivos exportados por série e snapshot (timestamp)
+
+    Percorre também os subdiretórios (ex.: exports/<instância>/<projeto>/ da
+    exportação distribuída); cada diretório tem suas próprias séries.
+    Retorna também os temporários abandonados por exports interrompidos.
+    """
+    snapshots = {}
+    stale_tmp_files = []
+    directories = [EXPORTS_DIR]
+    stale_before = time.time() - STALE_TMP_SECONDS
+
+    # Uma única passada com scandir, sem stat de arquivos que não são exports
+    while directories:
+        directory = directories.pop()
+        relative_dir = os.path.relpath(directory, EXPORTS_DIR)
+
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    # .store, .cache e outros diretórios internos ficam de fora
+                    if not entry.name.startswith('.'):
+                        directories.append(entry.path)
+                    continue
+
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+
+                if entry.name.startswith(TMP_PREFIX):
+                    if entry.stat(follow_symlinks=False).st_mtime < stale_before:
+                        stale_tmp_files.append(entry.path)
+                    continue
+
+                match = EXPORT_PATTERN.match(entry.name)
+                if not match:
+                    continue
+
+                try:
+                    timestamp = datetime.strptime(match.group('timestamp'), "%Y%m%d_%H%M%S")
+                except ValueError:
+                    print(f"⚠️  Ignorando {entry.path}: data inválida no nome")
+                    continue
+
+                serie = os.path.normpath(os.path.join(relative_dir, match.group('serie')))
+                snapshots.setdefault((serie, timestamp), []).append(entry.path)
+
+    return snapshots, stale_tmp_files
+
+def select_snapshots_to_keep(snapshots):
+    """Aplica a política de retenção (diária/semanal) a cada série"""
+    keep = set()
+
+    series = {}
+    for serie, timestamp in snapshots:
+        series.setdefault(serie, []).append(timestamp)
+
+    for serie, timestamps in series.items():
+        timestamps.sort(reverse=True)
+
+        # O snapshot mais recente é sempre mantido
+        keep.add((serie, timestamps[0]))
+
+        # Mais recente de cada dia, para os últimos KEEP_DAILY dias com exports
+        seen_days = set()
+        # Mais recente de cada semana ISO, para as últimas KEEP_WEEKLY semanas
+        seen_weeks = set()
+
+        for timestamp in timestamps:
+            day = timestamp.date()
+            if day not in seen_days and len(seen_days) < KEEP_DAILY:
+                seen_days.add(day)
+                keep.add((serie, timestamp))
+
+            week = timestamp.isocalendar()[:2]
+            if week not in seen_weeks and len(seen_weeks) < KEEP_WEEKLY:
+                seen_weeks.add(week)
+                keep.add((serie, timestamp))
+
+    return keep
+
+def hash_file(path):
+    """Calcula o SHA-256 do conteúdo do arquivo"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def store_path(digest):
+    """Caminho do objeto no repositório endereçado por conteúdo"""
+    return os.path.join(STORE_DIR, digest[:2], digest)
+
+def atomic_link(source, target):
+    """Substitui target por um hard link para source de forma atômica"""
+    directory = os.path.dirname(target) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=TMP_PREFIX)
+    os.close(fd)
+    os.unlink(tmp_path)
+    try:
+        os.link(source, tmp_path)
+        os.replace(tmp_path, target)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def deduplicate_file(path):
+    """Move o conteúdo do arquivo para o store e o substitui por um hard link
+
+    Retorna o número de bytes economizados (0 se o conteúdo ainda não existia).
+    """
+    stat = os.stat(path)
+
+    # Arquivos com mais de um link já estão no store: não é preciso reler
+    if stat.st_nlink > 1:
+        return 0
+
+    digest = hash_file(path)
+    obj = store_path(digest)
+
+    if DRY_RUN:
+        return stat.st_size if os.path.exists(obj) else 0
+
+    os.makedirs(os.path.dirname(obj), exist_ok=True)
+
+    try:
+        if os.path.exists(obj):
+            atomic_link(obj, path)
+            return stat.st_size
+
+        os.link(path, obj)
+    except FileExistsError:
+        # Outro processo criou o mesmo objeto ao mesmo tempo
+        atomic_link(obj, path)
+        return stat.st_size
+    except OSError as e:
+        print(f"⚠️  Não foi possível criar hard link para {path}: {e}")
+
+    return 0
+
+def compress_file(path, algorithm):
+    """Comprime o arquivo e remove o original, retornando o novo caminho"""
+    target = f"{path}.zst" if algorithm == 'zstd' else f"{path}.gz"
+
+    if DRY_RUN:
+        return target
+
+    # Compressão em streaming, sem carregar o export inteiro em memória.
+    # Saída determinística (sem mtime/nome no cabeçalho) para que conteúdos
+    # iguais gerem arquivos comprimidos iguais e continuem deduplicáveis
+    def write(output):
+        with open(path, 'rb') as source:
+            if algorithm == 'zstd':
+                compressor = zstandard.ZstdCompressor(level=10)
+                with compressor.stream_writer(output, closefd=False) as writer:
+                    for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                        writer.write(chunk)
+            else:
+                with gzip.GzipFile(filename='', fileobj=output, mode='wb',
+                                   compresslevel=9, mtime=0) as writer:
+                    for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                        writer.write(chunk)
+
+    atomic_write(target, write, os.stat(path).st_mode & 0o777)
+    os.unlink(path)
+    return target
+
+def garbage_collect_store():
+    """Remove objetos do store que não são mais referenciados por nenhum export"""
+    removed = 0
+    if not os.path.isdir(STORE_DIR):
+        return removed
+
+    for prefix in os.scandir(STORE_DIR):
+        if not prefix.is_dir(follow_symlinks=False):
+            continue
+
+        for obj in os.scandir(prefix.path):
+            # Apenas o próprio store referencia o objeto
+            if obj.stat(follow_symlinks=False).st_nlink == 1:
+                if not DRY_RUN:
+                    os.unlink(obj.path)
+                removed += 1
+
+        if not DRY_RUN and not os.listdir(prefix.path):
+            os.rmdir(prefix.path)
+
+    return removed
+
+def apply_retention():
+    """Aplica retenção, compressão e deduplicação ao diretório de exports"""
+    if not os.path.isdir(EXPORTS_DIR):
+        print(f"❌ Diretório {EXPORTS_DIR}/ não encontrado")
+        return None
+
+    algorithm = get_compression()
+    compress_before = datetime.now() - timedelta(days=COMPRESS_AFTER_DAYS)
+
+    snapshots, stale_tmp_files = scan_exports()
+    keep = select_snapshots_to_keep(snapshots)
+
+    stats = {
+        'snapshots': len(snapshots),
+        'removed_files': 0,
+        'stale_tmp_removed': len(stale_tmp_files),
+        'compressed_files': 0,
+        'deduplicated_files': 0,
+        'bytes_saved': 0,
+        'store_objects_removed': 0
+    }
+
+    for path in stale_tmp_files:
+        print(f"🗑️  Removendo temporário abandonado {path}")
+        if not DRY_RUN:
+            os.unlink(path)
+
+    for (serie, timestamp), paths in sorted(snapshots.items()):
+        if (serie, timestamp) not in keep:
+            for path in paths:
+                print(f"🗑️  Removendo {path}")
+                if not DRY_RUN:
+                    os.unlink(path)
+                stats['removed_files'] += 1
+            continue
+
+        for path in paths:
+            should_compress = (
+                algorithm != 'none'
+                and timestamp < compress_before
+                and not path.endswith(COMPRESSED_SUFFIXES)
+                and path.rsplit('.', 1)[-1] in COMPRESSIBLE_EXTENSIONS
+            )
+            if should_compress:
+                path = compress_file(path, algorithm)
+                stats['compressed_files'] += 1
+                if DRY_RUN:
+                    continue
+
+            saved = deduplicate_file(path)
+            if saved:
+                stats['deduplicated_files'] += 1
+                stats['bytes_saved'] += saved
+
+    stats['store_objects_removed'] = garbage_collect_store()
+    return stats
+
+def main():
+    """Função principal"""
+    print("🧹 Iniciando retenção dos exports do SonarQube")
+    print(f"📁 Diretório: {EXPORTS_DIR}/")
+    print(f"📋 Política: {KEEP_DAILY} diário(s), {KEEP_WEEKLY} semanal(is)")
+    print(f"🗜️  Compressão: {get_compression()} após {COMPRESS_AFTER_DAYS} dia(s)")
+    if DRY_RUN:
+        print("💡 Modo simulação (RETENTION_DRY_RUN): nenhum arquivo será alterado")
+
+    stats = apply_retention()
+    if stats is None:
+        sys.exit(1)
+
+    print(f"\n📊 Snapshots analisados: {stats['snapshots']}")
+    print(f"   • Arquivos removidos: {stats['removed_files']}")
+    print(f"   • Temporários abandonados removidos: {stats['stale_tmp_removed']}")
+    print(f"   • Arquivos comprimidos: {stats['compressed_files']}")
+    print(f"   • Arquivos deduplicados: {stats['deduplicated_files']} "
+          f"({stats['bytes_saved']} bytes economizados)")
+    print(f"   • Objetos órfãos removidos do store: {stats['store_objects_removed']}")
+    print("\n🎉 Retenção concluída com sucesso!")
+
+if __name__ == "__main__":
+    main()
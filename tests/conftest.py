@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Os scripts são executados diretamente (python scripts/...): importar da mesma forma
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Servidor SonarQube simulado para testar os scripts de exportação
+
+Uso standalone:
+    python tests/mock_sonarqube.py 9000
+"""
+
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import sys
+
+PROJECTS = ['p1', 'p2']
+
+class MockSonarQubeHandler(BaseHTTPRequestHandler):
+    """Responde aos endpoints usados pelos scripts de exportação"""
+
+    # Atraso das métricas, para que um export fique "em andamento" nos testes
+    metrics_delay = 0
+    # Chamadas recebidas: lista de (endpoint, parâmetros)
+    calls = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.calls.append((url.path, query))
+
+        routes = {
+            '/api/system/status': lambda: {'status': 'UP'},
+            '/api/components/search': lambda: {
+                'components': [{'key': key} for key in PROJECTS],
+                'paging': {'total': len(PROJECTS)}
+            },
+            '/api/components/show': lambda: {'component': {'analysisDate': '2026-10-01T00:00:00+0000'}},
+            '/api/measures/component': self.get_measures,
+            '/api/issues/search': lambda: {
+                'issues': [
+                    {'key': 'i1', 'component': f"{query['componentKeys']}:app.py",
+                     'line': 5, 'type': 'BUG', 'severity': 'MAJOR', 'status': 'OPEN'}
+                ],
+                'total': 1
+            },
+            '/api/sources/lines': lambda: {
+                'sources': [
+                    {'line': line, 'code': f'<span class="k">x</span> = {line}'}
+                    for line in range(int(query['from']), int(query['to']) + 1)
+                ]
+            },
+            '/api/qualitygates/project_status': lambda: {'projectStatus': {'status': 'OK', 'conditions': []}},
+            '/api/qualitygates/get_by_project': lambda: {'qualityGate': {}},
+            '/api/project_analyses/search': lambda: {'analyses': []}
+        }
+
+        route = routes.get(url.path)
+        if route is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        body = json.dumps(route()).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def get_measures(self):
+        """Métricas do projeto (com atraso configurável)"""
+        time.sleep(self.metrics_delay)
+        return {'component': {'measures': [{'metric': 'ncloc', 'value': '10'}]}}
+
+def start_server(port=0, metrics_delay=0):
+    """Inicia o servidor em uma thread e retorna (servidor, url)
+
+    As chamadas recebidas ficam em server.calls.
+    """
+    handler = type('Handler', (MockSonarQubeHandler,), {'metrics_delay': metrics_delay, 'calls': []})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.calls = handler.calls
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def main():
+    """Função principal"""
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 9000
+    server, url = start_server(port)
+    print(f"🚀 SonarQube simulado em {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
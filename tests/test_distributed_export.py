@@ -0,0 +1,200 @@
+"""
+Testes da exportação distribuída com vários workers locais e um SonarQube simulado
+"""
+
+import os
+import json
+import time
+import signal
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from mock_sonarqube import start_server
+
+SCRIPT = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'distributed_export.py')
+
+@pytest.fixture
+def sonarqube():
+    server, url = start_server(metrics_delay=2)
+    yield url
+    server.shutdown()
+
+def make_env(tmp_path, **extra):
+    env = dict(os.environ)
+    env.update({
+        'EXPORT_QUEUE_DB': str(tmp_path / 'queue.db'),
+        'EXPORT_INSTANCES_FILE': str(tmp_path / 'instances.json'),
+        'EXPORT_OUTPUT_DIR': str(tmp_path / 'exports'),
+        'EXPORT_LEASE_SECONDS': '3',
+        'EXPORT_POLL_SECONDS': '1',
+        'PYTHONUNBUFFERED': '1'
+    })
+    env.update(extra)
+    return env
+
+def start(mode, env, **extra):
+    return subprocess.Popen(
+        [sys.executable, SCRIPT, mode], env={**env, **extra},
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+        start_new_session=True
+    )
+
+def query(tmp_path, sql):
+    conn = sqlite3.connect(str(tmp_path / 'queue.db'), timeout=30)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+def wait_for(condition, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if condition():
+                return
+        except sqlite3.OperationalError:
+            # Fila ainda sendo criada
+            pass
+        time.sleep(0.2)
+    raise AssertionError("tempo esgotado")
+
+def test_workers_recover_units_from_crashed_worker(tmp_path, sonarqube):
+    (tmp_path / 'instances.json').write_text(json.dumps([
+        {'name': 'a', 'url': sonarqube},
+        {'name': 'b', 'url': sonarqube, 'projects': [{'key': 'p3', 'branches': ['main', 'dev']}]}
+    ]))
+    env = make_env(tmp_path)
+
+    coordinator = start('coordinator', env)
+    wait_for(lambda: (tmp_path / 'queue.db').exists()
+             and query(tmp_path, "SELECT COUNT(*) FROM work_units")[0][0] == 12)
+
+    # Matar o worker (e o export em andamento) enquanto ele segura um lease
+    crashed = start('worker', env, EXPORT_WORKER_ID='crashed')
+    wait_for(lambda: query(tmp_path, "SELECT COUNT(*) FROM work_units WHERE worker = 'crashed'")[0][0] == 1)
+    os.killpg(crashed.pid, signal.SIGKILL)
+    crashed.wait()
+    crashed_unit = query(tmp_path, "SELECT id FROM work_units WHERE worker = 'crashed'")[0][0]
+
+    workers = [start('worker', env, EXPORT_WORKER_ID=f'w{i}') for i in range(3)]
+    for worker in workers:
+        output, _ = worker.communicate(timeout=180)
+        assert worker.returncode == 0, output
+
+    output, _ = coordinator.communicate(timeout=60)
+    assert coordinator.returncode == 0, output
+
+    units = query(tmp_path, "SELECT id, status, attempts FROM work_units")
+    assert {status for _, status, _ in units} == {'done'}
+    assert dict((unit_id, attempts) for unit_id, _, attempts in units)[crashed_unit] == 2
+
+    for unit_dir in ['a/p1', 'a/p2', 'b/p3/main', 'b/p3/dev']:
+        names = os.listdir(tmp_path / 'exports' / unit_dir)
+        for prefix in ['metrics_', 'issues_', 'quality_gate_']:
+            assert any(name.startswith(prefix) and name.endswith('.json') for name in names)
+
+def test_failed_discovery_fails_the_run(tmp_path):
+    # Porta sem servidor: a descoberta de projetos falha
+    (tmp_path / 'instances.json').write_text(json.dumps([
+        {'name': 'offline', 'url': 'http://127.0.0.1:9'}
+    ]))
+
+    coordinator = start('coordinator', make_env(tmp_path))
+    output, _ = coordinator.communicate(timeout=60)
+
+    assert coordinator.returncode == 1, output
+    assert query(tmp_path, "SELECT export_type, status FROM work_units") == [('discovery', 'failed')]
+
+def test_coordinator_fails_run_without_workers(tmp_path, sonarqube):
+    (tmp_path / 'instances.json').write_text(json.dumps([
+        {'name': 'a', 'url': sonarqube, 'projects': [{'key': 'p1'}]}
+    ]))
+
+    coordinator = start('coordinator', make_env(tmp_path, EXPORT_RUN_TIMEOUT='2'))
+    output, _ = coordinator.communicate(timeout=60)
+
+    assert coordinator.returncode == 1, output
+    assert {row for row in query(tmp_path, "SELECT status, error FROM work_units")} == {
+        ('failed', 'tempo limite da execução excedido')
+    }
+
+def test_coordinator_expires_leases_of_dead_workers(tmp_path, sonarqube):
+    (tmp_path / 'instances.json').write_text(json.dumps([
+        {'name': 'a', 'url': sonarqube, 'projects': [{'key': 'p1'}]}
+    ]))
+    env = make_env(tmp_path, EXPORT_TYPES='metrics', EXPORT_MAX_ATTEMPTS='1')
+
+    coordinator = start('coordinator', env)
+    wait_for(lambda: query(tmp_path, "SELECT COUNT(*) FROM work_units")[0][0] == 1)
+
+    crashed = start('worker', env, EXPORT_WORKER_ID='crashed')
+    wait_for(lambda: query(tmp_path, "SELECT worker FROM work_units")[0][0] == 'crashed')
+    os.killpg(crashed.pid, signal.SIGKILL)
+    crashed.wait()
+
+    # Nenhum outro worker: o próprio coordenador expira o lease e encerra
+    output, _ = coordinator.communicate(timeout=60)
+    assert coordinator.returncode == 1, output
+    assert query(tmp_path, "SELECT status, error FROM work_units") == [('failed', 'lease expirado')]
+
+def test_worker_stops_export_when_lease_is_lost(tmp_path):
+    server, url = start_server(metrics_delay=30)
+    try:
+        (tmp_path / 'instances.json').write_text(json.dumps([
+            {'name': 'a', 'url': url, 'projects': [{'key': 'p1'}]}
+        ]))
+        env = make_env(tmp_path, EXPORT_TYPES='metrics')
+        coordinator = start('coordinator', env)
+        wait_for(lambda: query(tmp_path, "SELECT COUNT(*) FROM work_units")[0][0] == 1)
+
+        worker = start('worker', env, EXPORT_WORKER_ID='w1')
+        wait_for(lambda: query(tmp_path, "SELECT worker FROM work_units")[0][0] == 'w1')
+
+        # Outro worker assumiu e concluiu a unidade
+        conn = sqlite3.connect(str(tmp_path / 'queue.db'), timeout=30)
+        conn.execute("UPDATE work_units SET status = 'done', worker = 'outro'")
+        conn.commit()
+        conn.close()
+
+        started = time.time()
+        output, _ = worker.communicate(timeout=60)
+        assert time.time() - started < 20
+        assert 'export interrompido' in output
+        assert query(tmp_path, "SELECT status, worker FROM work_units") == [('done', 'outro')]
+        assert not os.listdir(tmp_path / 'exports' / 'a' / 'p1')
+
+        output, _ = coordinator.communicate(timeout=60)
+        assert coordinator.returncode == 0, output
+    finally:
+        server.shutdown()
+
+def test_heartbeat_retries_when_queue_is_locked(tmp_path, monkeypatch):
+    import distributed_export
+
+    server, url = start_server(metrics_delay=2)
+    monkeypatch.setattr(distributed_export, 'QUEUE_DB', str(tmp_path / 'queue.db'))
+    monkeypatch.setattr(distributed_export, 'OUTPUT_DIR', str(tmp_path / 'exports'))
+    monkeypatch.setattr(distributed_export, 'LEASE_SECONDS', 0.6)
+
+    attempts = []
+
+    def flaky_renew_lease(conn, unit_id):
+        attempts.append(unit_id)
+        if len(attempts) <= 2:
+            raise sqlite3.OperationalError('database is locked')
+        return True
+
+    monkeypatch.setattr(distributed_export, 'renew_lease', flaky_renew_lease)
+
+    unit = {'id': 1, 'instance': 'a', 'project': 'p1', 'branch': '', 'export_type': 'metrics'}
+    instance = {'url': url, 'username': 'admin', 'password': 'admin'}
+    try:
+        assert distributed_export.run_unit(unit, instance) is None
+    finally:
+        server.shutdown()
+
+    assert len(attempts) > 2
+    assert any(name.startswith('metrics_p1_') for name in os.listdir(tmp_path / 'exports' / 'a' / 'p1'))
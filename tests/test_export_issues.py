@@ -0,0 +1,77 @@
+"""
+Testes do enriquecimento das issues com trechos de código
+"""
+
+import json
+
+import pytest
+
+import export_issues
+from mock_sonarqube import start_server
+
+@pytest.fixture
+def sonarqube(tmp_path, monkeypatch):
+    server, url = start_server()
+    monkeypatch.setattr(export_issues, 'SONAR_URL', url)
+    monkeypatch.setattr(export_issues, 'PROJECT_KEY', 'p1')
+    monkeypatch.setattr(export_issues, 'SOURCE_CONTEXT_LINES', 2)
+    monkeypatch.setattr(export_issues, 'SOURCE_CACHE_FILE', str(tmp_path / 'cache' / 'source_lines.json'))
+    yield server
+    server.shutdown()
+
+def source_calls(server):
+    return [query for path, query in server.calls if path == '/api/sources/lines']
+
+ISSUES = [
+    {'key': 'a1', 'component': 'p1:a.py', 'line': 1},
+    {'key': 'a2', 'component': 'p1:a.py', 'line': 20000},
+    {'key': 'a3', 'component': 'p1:a.py', 'textRange': {'startLine': 10, 'endLine': 11}},
+    {'key': 'b1', 'component': 'p1:b.py', 'line': 7},
+    {'key': 'sem_linha', 'component': 'p1:c.py'}
+]
+
+def test_one_request_per_file_and_cache_hit_on_second_run(sonarqube, tmp_path):
+    contexts = export_issues.enrich_issues_with_source(ISSUES)
+
+    calls = source_calls(sonarqube)
+    assert sorted((call['key'], call['from'], call['to']) for call in calls) == [
+        ('p1:a.py', '1', '20002'),
+        ('p1:b.py', '5', '9')
+    ]
+    assert contexts['a2'].splitlines()[2] == '>20000 | x = 20000'
+    assert contexts['a3'].splitlines() == [
+        f"{'>' if line in (10, 11) else ' '}{line:>5} | x = {line}" for line in range(8, 14)
+    ]
+    assert 'sem_linha' not in contexts
+
+    # Apenas as janelas ao redor das issues vão para o cache
+    with open(tmp_path / 'cache' / 'source_lines.json', encoding='utf-8') as f:
+        cache = json.load(f)
+    cached_a = next(entry for key, entry in cache.items() if key.endswith('|p1:a.py@2026-10-01T00:00:00+0000'))
+    assert cached_a['windows'] == [[1, 3], [8, 13], [19998, 20002]]
+    assert len(cached_a['lines']) == 14
+
+    sonarqube.calls.clear()
+    assert export_issues.enrich_issues_with_source(ISSUES) == contexts
+    assert source_calls(sonarqube) == []
+
+def test_cache_is_bounded_by_total_lines(sonarqube, monkeypatch):
+    monkeypatch.setattr(export_issues, 'SOURCE_CACHE_MAX_LINES', 10)
+
+    export_issues.enrich_issues_with_source([{'key': 'a', 'component': 'p1:a.py', 'line': 50}])
+    export_issues.enrich_issues_with_source([{'key': 'b', 'component': 'p1:b.py', 'line': 50}])
+
+    # 5 linhas por arquivo: os dois cabem; um terceiro expulsa o mais antigo
+    export_issues.enrich_issues_with_source([{'key': 'c', 'component': 'p1:c.py', 'line': 50}])
+    cache = export_issues.load_source_cache()
+    assert [key.split('|')[-1].split('@')[0] for key in cache] == ['p1:b.py', 'p1:c.py']
+
+def test_long_snippets_are_truncated(sonarqube, monkeypatch):
+    monkeypatch.setattr(export_issues, 'SOURCE_CONTEXT_MAX_CHARS', 500)
+
+    contexts = export_issues.enrich_issues_with_source([
+        {'key': 'classe', 'component': 'p1:a.py', 'textRange': {'startLine': 1, 'endLine': 5000}}
+    ])
+
+    assert len(contexts['classe']) <= 500
+    assert contexts['classe'].endswith('... (trecho truncado)')
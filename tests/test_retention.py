@@ -0,0 +1,160 @@
+"""
+Testes da retenção, deduplicação e compressão dos exports
+"""
+
+import os
+from datetime import datetime
+
+import pytest
+
+import retention
+
+@pytest.fixture
+def exports(tmp_path, monkeypatch):
+    exports_dir = tmp_path / 'exports'
+    exports_dir.mkdir()
+    monkeypatch.setattr(retention, 'EXPORTS_DIR', str(exports_dir))
+    monkeypatch.setattr(retention, 'STORE_DIR', str(exports_dir / '.store'))
+    monkeypatch.setattr(retention, 'KEEP_DAILY', 7)
+    monkeypatch.setattr(retention, 'KEEP_WEEKLY', 4)
+    monkeypatch.setattr(retention, 'COMPRESSION', 'none')
+    monkeypatch.setattr(retention, 'DRY_RUN', False)
+    return exports_dir
+
+def write_export(directory, name, content=b'a,b\n1,2\n'):
+    path = directory / name
+    path.write_bytes(content)
+    return path
+
+def snapshot_tree(directory):
+    tree = {}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            with open(path, 'rb') as f:
+                tree[path] = (stat.st_ino, stat.st_nlink, f.read())
+    return tree
+
+def test_keeps_latest_snapshot_per_day_and_week(monkeypatch):
+    monkeypatch.setattr(retention, 'KEEP_DAILY', 2)
+    monkeypatch.setattr(retention, 'KEEP_WEEKLY', 2)
+
+    timestamps = [
+        datetime(2026, 10, 14, 8), datetime(2026, 10, 14, 20),  # quarta (semana 42)
+        datetime(2026, 10, 13, 12),                              # terça (semana 42)
+        datetime(2026, 10, 12, 12),                              # segunda (semana 42)
+        datetime(2026, 10, 7, 12), datetime(2026, 10, 6, 12),    # semana 41
+        datetime(2026, 9, 30, 12)                                # semana 40
+    ]
+    keep = retention.select_snapshots_to_keep({('metrics_teste', ts): [] for ts in timestamps})
+
+    assert keep == {
+        ('metrics_teste', datetime(2026, 10, 14, 20)),  # diário + semanal (semana 42)
+        ('metrics_teste', datetime(2026, 10, 13, 12)),  # diário
+        ('metrics_teste', datetime(2026, 10, 7, 12))    # semanal (semana 41)
+    }
+
+def test_newest_snapshot_is_always_kept(monkeypatch):
+    monkeypatch.setattr(retention, 'KEEP_DAILY', 0)
+    monkeypatch.setattr(retention, 'KEEP_WEEKLY', 0)
+
+    snapshots = {
+        ('issues_teste', datetime(2026, 1, 1)): [],
+        ('issues_teste', datetime(2026, 1, 2)): [],
+        ('metrics_teste', datetime(2025, 1, 1)): []
+    }
+
+    assert retention.select_snapshots_to_keep(snapshots) == {
+        ('issues_teste', datetime(2026, 1, 2)),
+        ('metrics_teste', datetime(2025, 1, 1))
+    }
+
+def test_series_are_separated_per_directory(exports):
+    (exports / 'prod' / 'teste').mkdir(parents=True)
+    write_export(exports, 'metrics_teste_20261001_120000.csv')
+    write_export(exports / 'prod' / 'teste', 'metrics_teste_20261001_120000.csv')
+    write_export(exports, 'metrics_teste_20241399_000000.csv')  # data inválida: ignorado
+
+    snapshots, _ = retention.scan_exports()
+
+    assert set(snapshots) == {
+        ('metrics_teste', datetime(2026, 10, 1, 12)),
+        (os.path.join('prod', 'teste', 'metrics_teste'), datetime(2026, 10, 1, 12))
+    }
+
+def test_identical_exports_share_one_store_object(exports):
+    first = write_export(exports, 'metrics_teste_20261001_120000.csv')
+    second = write_export(exports, 'issues_teste_20261001_120000.csv')
+    different = write_export(exports, 'quality_gate_teste_20261001_120000.csv', b'x\n')
+
+    stats = retention.apply_retention()
+
+    assert stats['deduplicated_files'] == 1
+    assert os.stat(first).st_ino == os.stat(second).st_ino
+    assert os.stat(first).st_nlink == 3   # dois exports + objeto no store
+    assert os.stat(different).st_nlink == 2
+    assert len(list((exports / '.store').rglob('*/*'))) == 2
+
+    # Uma nova passada não relê nem altera nada
+    assert retention.apply_retention()['deduplicated_files'] == 0
+
+def test_store_objects_are_collected_after_exports_are_deleted(exports, monkeypatch):
+    monkeypatch.setattr(retention, 'KEEP_DAILY', 1)
+    monkeypatch.setattr(retention, 'KEEP_WEEKLY', 0)
+
+    old = write_export(exports, 'metrics_teste_20261001_120000.csv')
+    new = write_export(exports, 'metrics_teste_20261002_120000.csv')
+    orphan = write_export(exports, 'issues_teste_20261001_120000.csv', b'unico\n')
+    retention.apply_retention()
+    assert os.stat(new).st_nlink == 2
+    assert not old.exists()
+
+    # O export removido deixa de referenciar o objeto; o restante continua
+    orphan.unlink()
+    stats = retention.apply_retention()
+
+    assert stats['store_objects_removed'] == 1
+    assert os.stat(new).st_nlink == 2
+    assert len(list((exports / '.store').rglob('*/*'))) == 1
+
+def test_gzip_output_is_identical_for_identical_input(exports):
+    first = write_export(exports, 'metrics_teste_20261001_120000.json', b'{"a": 1}\n' * 1000)
+    second = write_export(exports, 'metrics_teste_20261002_120000.json', b'{"a": 1}\n' * 1000)
+    os.utime(first, (0, 0))
+
+    first_gz = retention.compress_file(str(first), 'gzip')
+    second_gz = retention.compress_file(str(second), 'gzip')
+
+    with open(first_gz, 'rb') as f1, open(second_gz, 'rb') as f2:
+        assert f1.read() == f2.read()
+    assert not first.exists() and not second.exists()
+
+def test_dry_run_leaves_tree_untouched(exports, monkeypatch):
+    monkeypatch.setattr(retention, 'KEEP_DAILY', 1)
+    monkeypatch.setattr(retention, 'KEEP_WEEKLY', 0)
+    monkeypatch.setattr(retention, 'COMPRESSION', 'gzip')
+    monkeypatch.setattr(retention, 'DRY_RUN', True)
+
+    for day in ('01', '02', '03'):
+        write_export(exports, f'metrics_teste_202610{day}_120000.csv')
+        write_export(exports, f'metrics_teste_202610{day}_120000.json', b'{}\n')
+    stale = write_export(exports, '.tmp_abandonado', b'parcial')
+    os.utime(stale, (0, 0))
+    before = snapshot_tree(exports)
+
+    stats = retention.apply_retention()
+
+    assert stats['removed_files'] == 4
+    assert stats['compressed_files'] == 2
+    assert snapshot_tree(exports) == before
+
+def test_stale_temporary_files_are_removed(exports):
+    stale = write_export(exports, '.tmp_abandonado', b'parcial')
+    recent = write_export(exports, '.tmp_em_andamento', b'parcial')
+    os.utime(stale, (0, 0))
+
+    retention.apply_retention()
+
+    assert not stale.exists()
+    assert recent.exists()